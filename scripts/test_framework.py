@@ -44,7 +44,8 @@ if __name__ == '__main__':
     G.remove_edges_from(nx.selfloop_edges(G))
     G = nx.k_core(G, 1)
 
-    multilabel = isinstance(list(G.nodes(data="community"))[0][1], list)
+    _, first_community = next(iter(G.nodes(data="community")))
+    multilabel = isinstance(first_community, list)
 
     params = dict(
             out_dim=150,
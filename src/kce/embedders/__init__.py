@@ -1,2 +1,2 @@
-from .walk_based import DeepWalk, CoreWalkLinear, CoreWalkPower, CoreWalkSigmoid, CoreWalk
+from .walk_based import DeepWalk, CoreWalkLinear, CoreWalkPower, CoreWalkSigmoid, CoreWalk, Node2Vec
 from .embedder import Embedder
@@ -38,17 +38,18 @@ class Embedder:
         }
 
     def transform(self, graph: Graph, nodelist=None):
-        if not self.embeddings and not self.node2id:
+        if self.embeddings is None or self.node2id is None:
             raise Exception("Not fitted yet")
 
+        # Gather rows with one fancy-index call instead of stacking |V|
+        # per-node row copies
         if nodelist:
-            return np.array([
-                self.embeddings[self.node2id[node]] for node in nodelist if node in graph
-            ])
+            ids = np.fromiter((self.node2id[node] for node in nodelist if node in graph),
+                              dtype=np.int64)
         else:
-            return np.array([
-                self.embeddings[self.node2id[node]] for node in graph
-            ])
+            ids = np.fromiter((self.node2id[node] for node in graph),
+                              dtype=np.int64, count=graph.number_of_nodes())
+        return self.embeddings[ids]
 
     def fit_transform(self, graph: Graph, nodelist=None, **kwargs):
         self.fit(graph, **kwargs)
@@ -1,2 +1,3 @@
 from .corewalk import *
 from .deepwalk import *
+from .node2vec import *
@@ -1,38 +1,56 @@
 from networkx import Graph, core_number
 import numpy as np
-import multiprocessing as mp
-from itertools import repeat
+import weakref
+from scipy.special import expit
 
-from ...utils import timeit
-from .walks import generate_rw
+from ...utils import timeit, NUMBA_AVAILABLE
+if NUMBA_AVAILABLE:
+    from ...utils import core_number_fast
+from .walks import to_csr
 from .deepwalk import DeepWalk
 
 
+# Core numbers keyed by graph object: the decomposition is deterministic,
+# so experiment reps on the same graph pay for it only once.
+_core_cache = weakref.WeakKeyDictionary()
+
+
 class CoreWalk(DeepWalk):
 
     def _n_walks(self, k, k_max):
+        return int(self._n_walks_vec(np.array([k]), k_max)[0])
+
+    def _n_walks_vec(self, k_arr, k_max):
+        """Vectorized walk counts for an array of core indexes."""
         raise NotImplementedError
 
     @timeit(var_name="k_core_decomposition")
     def _k_core_dec(self, graph):
-        return core_number(graph)
+        if graph not in _core_cache:
+            if NUMBA_AVAILABLE:
+                indptr, indices, _, _, id2node = to_csr(graph)
+                cores = core_number_fast(indptr, indices)
+                _core_cache[graph] = dict(zip(id2node, cores.tolist()))
+            else:
+                _core_cache[graph] = core_number(graph)
+        return _core_cache[graph]
 
     @timeit(var_name="generate_walks")
     def _generate_walks(self, graph: Graph):
         core_numbers = self._k_core_dec(graph)
         k_max = max(core_numbers.values())
-        k_n_walks = [self._n_walks(k, k_max) for k in range(1, k_max + 1)]
-
-        nodes = [node for node in graph for _ in range(k_n_walks[core_numbers[node] - 1])]
+        # Walk counts per core index, then one np.repeat instead of a
+        # Python loop over |V| * n_walks start nodes
+        k_n_walks = self._n_walks_vec(np.arange(1, k_max + 1), k_max)
 
-        with mp.Pool() as pool:
+        # Start ids in CSR order, repeated per-node by walk count
+        _, _, _, _, id2node = to_csr(graph)
+        core_arr = np.fromiter((core_numbers[node] for node in id2node),
+                               dtype=np.int64, count=len(id2node))
+        starts = np.repeat(np.arange(len(id2node), dtype=np.int32),
+                           k_n_walks[core_arr - 1])
 
-            res = pool.starmap_async(func=generate_rw,
-                                     iterable=zip(repeat(graph),
-                                                  nodes,
-                                                  repeat(self.walk_length)))
-            walks = res.get()
-        return walks
+        return self._pooled_walks(graph, starts)
 
 
 class CoreWalkLinear(CoreWalk):
@@ -42,8 +60,10 @@ class CoreWalkLinear(CoreWalk):
         self.offset_ = offset
         self.n_min_ = n_min
 
-    def _n_walks(self, k, k_max):
-        return max(int((self.n_walks - self.offset_) * (k / k_max) + self.offset_), self.n_min_)
+    def _n_walks_vec(self, k_arr, k_max):
+        return np.maximum(((self.n_walks - self.offset_) * (k_arr / k_max)
+                           + self.offset_).astype(np.int64),
+                          self.n_min_)
 
 
 class CoreWalkPower(CoreWalk):
@@ -51,19 +71,20 @@ class CoreWalkPower(CoreWalk):
         super().__init__(*args, **kwargs)
         self.pow_ = pow
 
-    def _n_walks(self, k, k_max):
-        return max(int(self.n_walks * np.power(k / k_max, self.pow_)), 1)
+    def _n_walks_vec(self, k_arr, k_max):
+        return np.maximum((self.n_walks
+                           * np.power(k_arr / k_max, self.pow_)).astype(np.int64),
+                          1)
 
 
 class CoreWalkSigmoid(CoreWalk):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-    def _sigmoid(self, x):
-        return 1/(1+np.exp(-x))
-
-    def _n_walks(self, k, k_max):
-        return max(
-                int(self.n_walks * self._sigmoid(10 * (k - k_max / 2) / k_max)),
+    def _n_walks_vec(self, k_arr, k_max):
+        # expit is the numerically stable sigmoid (no overflow in exp for
+        # large |x|), evaluated in a single ufunc call over all core indexes
+        return np.maximum(
+                (self.n_walks * expit(10 * (k_arr - k_max / 2) / k_max)).astype(np.int64),
                 1
             )
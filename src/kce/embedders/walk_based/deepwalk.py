@@ -1,23 +1,30 @@
 from networkx import Graph
 import numpy as np
 import multiprocessing as mp
-from itertools import repeat
+import os
+import tempfile
 import time
 from gensim.models import Word2Vec
 
 from ...utils import timeit
-from .walks import generate_rw
+from .walks import to_csr, share_csr, _row_cumsum, _init_rw_worker, generate_rw_batch, WalkCorpus
+from .walks import NUMBA_AVAILABLE
+if NUMBA_AVAILABLE:
+    from .walks import generate_rw_kernel
 from kce.embedders.embedder import Embedder
 
 
 class DeepWalk(Embedder):
 
-    def __init__(self, out_dim, n_walks, walk_length, win_size, *args, **kwargs):
+    def __init__(self, out_dim, n_walks, walk_length, win_size,
+                 negative=5, sample=1e-4, *args, **kwargs):
         super().__init__(out_dim, *args, **kwargs)
         self.n_generated_walks = None
         self.n_walks = n_walks
         self.walk_length = walk_length
         self.win_size = win_size
+        self.negative = negative
+        self.sample = sample
 
     def get_attributes(self):
         return {
@@ -25,39 +32,102 @@ class DeepWalk(Embedder):
             "n_walks": self.n_walks,
             "walk_length": self.walk_length,
             "window_size": self.win_size,
+            "negative": self.negative,
+            "sample": self.sample,
             "n_generated_walks": self.n_generated_walks
         }
 
     @timeit(var_name="skip_gram")
     def _skip_gram(self, walks):
-        model = Word2Vec(walks,
-                         size=self.out_dim_,
-                         window=self.win_size,
-                         min_count=0, sg=1, hs=1)
+        # Walks are short sentences: pack many of them per cython job so the
+        # per-sentence Python overhead does not dominate training.
+        # Negative sampling does O(negative) cache-friendly updates per pair
+        # where hierarchical softmax walks O(log |V|) Huffman nodes.
+        w2v_params = dict(vector_size=self.out_dim_,
+                          window=self.win_size,
+                          min_count=0, sg=1,
+                          hs=0, negative=self.negative, ns_exponent=0.75,
+                          sample=self.sample,
+                          workers=mp.cpu_count(),
+                          batch_words=max(10000, 100 * self.walk_length))
+
+        if isinstance(walks, WalkCorpus):
+            # corpus_file sidesteps the Python iterator: gensim's workers
+            # read the file concurrently, so training actually scales with
+            # cores instead of serializing on vocabulary/token handling.
+            fd, corpus_path = tempfile.mkstemp(suffix=".txt", prefix="walks_")
+            os.close(fd)
+            try:
+                walks.to_corpus_file(corpus_path)
+                model = Word2Vec(corpus_file=corpus_path, **w2v_params)
+            finally:
+                os.remove(corpus_path)
+            wv = model.wv
+            if walks.id2node is not None:
+                # The corpus file holds node ids; translate the vocabulary
+                # back to node labels so downstream bookkeeping is unchanged
+                wv.index_to_key = [walks.id2node[int(key)] for key in wv.index_to_key]
+                wv.key_to_index = {key: i for i, key in enumerate(wv.index_to_key)}
+            return wv
+
+        model = Word2Vec(walks, **w2v_params)
         return model.wv
 
     @timeit(var_name="generate_walks")
     def _generate_walks(self, graph: Graph):
-        nodes = list(graph) * self.n_walks
-        with mp.Pool() as pool:
-            res = pool.starmap_async(func=generate_rw,
-                                     iterable=zip(repeat(graph),
-                                                  nodes,
-                                                  repeat(self.walk_length)))
-            walks = res.get()
-        return walks
+        # n_walks starts per node, as a compact id array: no |V| * n_walks
+        # Python list of label references is ever materialized
+        n_nodes = graph.number_of_nodes()
+        starts = np.tile(np.arange(n_nodes, dtype=np.int32), self.n_walks)
+        return self._pooled_walks(graph, starts)
+
+    def _pooled_walks(self, graph: Graph, starts):
+        """
+        Generates first-order walks from the given start node ids (CSR ids,
+        see walks.to_csr). With numba installed all walks run in one
+        parallel nogil kernel over the CSR arrays — no process pool, no
+        pickling. Otherwise the walks are batched over a process pool: the
+        adjacency goes to the workers once as a shared-memory CSR block,
+        and each task carries a few thousand starts so IPC is O(n_chunks)
+        rather than O(n_walks).
+        """
+        indptr, indices, weights, node2id, id2node = to_csr(graph)
+
+        if NUMBA_AVAILABLE:
+            out = np.empty((starts.shape[0], self.walk_length), dtype=np.int32)
+            generate_rw_kernel(indptr, indices, _row_cumsum(indptr, weights),
+                               starts, self.walk_length, out)
+            return WalkCorpus(out, id2node)
+
+        shms = share_csr(graph, indptr, indices, weights)
+        chunks = [c for c in np.array_split(starts, mp.cpu_count() * 4) if c.size]
+        seeds = np.random.SeedSequence(np.random.randint(2 ** 31)).spawn(len(chunks))
+        tasks = list(zip(seeds, chunks))
+
+        out = np.empty((starts.shape[0], self.walk_length), dtype=np.int32)
+        pos = 0
+        with mp.Pool(initializer=_init_rw_worker,
+                     initargs=([shm.name for shm in shms], len(id2node),
+                               indices.shape[0], self.walk_length)) as pool:
+            for block in pool.imap(generate_rw_batch, tasks):
+                out[pos:pos + block.shape[0]] = block
+                pos += block.shape[0]
+        return WalkCorpus(out, id2node)
 
     def fit(self, graph: Graph, **kwargs):
         # Generate random walks
         walks = self._generate_walks(graph)
-        np.random.shuffle(walks)
+        if isinstance(walks, WalkCorpus):
+            walks.shuffle()
+        else:
+            np.random.shuffle(walks)
 
         # Compute the embedding by training Word2Vec
         wv = self._skip_gram(walks)
 
         self.n_generated_walks = len(walks)
         self.embeddings = wv.vectors
-        self.id2node = list(wv.index2word)
-        self.node2id = {word: index for index, word in enumerate(wv.index2word)}
+        self.id2node = list(wv.index_to_key)
+        self.node2id = {word: index for index, word in enumerate(wv.index_to_key)}
 
         return self
@@ -0,0 +1,399 @@
+from networkx import Graph
+import numpy as np
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+try:
+    import cudf
+    import cugraph
+    CUGRAPH_AVAILABLE = True
+except ImportError:
+    CUGRAPH_AVAILABLE = False
+
+from ...utils import timeit
+from .walks import to_csr, share_csr, WalkCorpus, build_alias_table, sample_alias_table
+from .deepwalk import DeepWalk
+
+
+def _sample_neighbour(indptr, indices, weights, node, node_tables, uniform, rng):
+    deg = indptr[node + 1] - indptr[node]
+    if uniform:
+        return indices[indptr[node] + rng.integers(deg)]
+    if node not in node_tables:
+        node_tables[node] = build_alias_table(weights[indptr[node]:indptr[node + 1]])
+    prob_table, alias_table = node_tables[node]
+    return indices[indptr[node] + sample_alias_table(prob_table, alias_table, rng)]
+
+
+def neighbour_sets(indptr, indices):
+    """
+    Precomputes one frozenset of neighbour ids per node, so the
+    prev-neighbour test of the biased walk is O(1) instead of a scan of the
+    CSR row at every candidate draw.
+    """
+    return [frozenset(indices[indptr[v]:indptr[v + 1]].tolist())
+            for v in range(indptr.shape[0] - 1)]
+
+
+def make_walker(indptr, indices, weights, len_walk, p, q, uniform=False):
+    """
+    Builds a walk function specialized for a fixed (p, q), over a CSR
+    adjacency (see walks.to_csr).
+
+    p and q are constant over a whole run, so the per-step branching on
+    them is resolved once here instead of inside the walk loop. When
+    p == q == 1 the returned closure is a pure first-order walk: plain rng
+    draws when uniform is set, cached first-order alias tables otherwise.
+    In the biased case, neighbours are proposed from the first-order
+    distribution and accepted by rejection — with 1/p, 1/q and the envelope
+    max(1, 1/p, 1/q) folded as constants — which avoids building per-edge
+    distributions altogether.
+
+    :param indptr: CSR index pointers
+    :param indices: CSR neighbour ids
+    :param weights: CSR edge weights
+    :param len_walk: Length of the walks
+    :param p: Return parameter
+    :param q: In-out parameter
+    :param uniform: Whether all edge weights are equal
+    :return: walk(node, rng) returning a walk as a list of node ids
+    """
+    node_tables = {}
+
+    if p == 1 and q == 1:
+        def walk(node, rng):
+            if indptr[node + 1] == indptr[node]:
+                return [node] * len_walk
+            steps = [node]
+            while len(steps) < len_walk:
+                steps.append(_sample_neighbour(indptr, indices, weights, steps[-1],
+                                               node_tables, uniform, rng))
+            return steps
+        return walk
+
+    inv_p, inv_q = 1. / p, 1. / q
+    bias_max = max(1., inv_p, inv_q)
+    nbr_sets = neighbour_sets(indptr, indices)
+
+    def walk(node, rng):
+        if indptr[node + 1] == indptr[node]:
+            return [node] * len_walk
+        steps = [node, _sample_neighbour(indptr, indices, weights, node,
+                                         node_tables, uniform, rng)]
+        while len(steps) < len_walk:
+            prev, curr = steps[-2], steps[-1]
+            while True:
+                candidate = _sample_neighbour(indptr, indices, weights, curr,
+                                              node_tables, uniform, rng)
+                if candidate == prev:
+                    bias = inv_p
+                elif candidate in nbr_sets[prev]:
+                    bias = 1.
+                else:
+                    bias = inv_q
+                if rng.random() * bias_max < bias:
+                    break
+            steps.append(candidate)
+        return steps
+    return walk
+
+
+# Per-worker walk context, populated once by the pool initializer so the CSR
+# arrays are not pickled along with every task.
+_worker_ctx = {}
+
+
+def _init_walk_worker(shm_names, n_nodes, n_edges, walk_length, p, q, uniform):
+    shms = [shared_memory.SharedMemory(name=name) for name in shm_names]
+    _worker_ctx["shms"] = shms  # keep references alive for the worker lifetime
+    indptr = np.ndarray((n_nodes + 1,), dtype=np.int64, buffer=shms[0].buf)
+    indices = np.ndarray((n_edges,), dtype=np.int32, buffer=shms[1].buf)
+    weights = np.ndarray((n_edges,), dtype=np.float32, buffer=shms[2].buf)
+    _worker_ctx["walk"] = make_walker(indptr, indices, weights, walk_length, p, q, uniform)
+
+
+def _walk_chunk(task):
+    seed, starts = task
+    rng = np.random.default_rng(seed)
+    walk = _worker_ctx["walk"]
+    return [walk(node, rng) for node in starts]
+
+
+if NUMBA_AVAILABLE:
+
+    @njit(cache=True)
+    def _vose(weights, prob_table, alias_table):
+        n = weights.shape[0]
+        scaled = weights * (n / weights.sum())
+        small = np.empty(n, dtype=np.int32)
+        large = np.empty(n, dtype=np.int32)
+        n_small, n_large = 0, 0
+        for i in range(n):
+            if scaled[i] < 1.:
+                small[n_small] = i
+                n_small += 1
+            else:
+                large[n_large] = i
+                n_large += 1
+        while n_small > 0 and n_large > 0:
+            n_small -= 1
+            n_large -= 1
+            s, l = small[n_small], large[n_large]
+            prob_table[s] = scaled[s]
+            alias_table[s] = l
+            scaled[l] = scaled[l] + scaled[s] - 1.
+            if scaled[l] < 1.:
+                small[n_small] = l
+                n_small += 1
+            else:
+                large[n_large] = l
+                n_large += 1
+        for i in range(n_large):
+            prob_table[large[i]] = 1.
+        for i in range(n_small):
+            prob_table[small[i]] = 1.
+
+    @njit(cache=True)
+    def _contains(indices, lo, hi, value):
+        # Binary search in the sorted CSR row indices[lo:hi]
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if indices[mid] < value:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo < indices.shape[0] and indices[lo] == value
+
+    @njit(parallel=True, cache=True)
+    def _build_node_tables(indptr, weights):
+        n_nodes = indptr.shape[0] - 1
+        node_prob = np.zeros(indptr[-1], dtype=np.float32)
+        node_alias = np.zeros(indptr[-1], dtype=np.int32)
+        for u in prange(n_nodes):
+            if indptr[u + 1] > indptr[u]:
+                _vose(weights[indptr[u]:indptr[u + 1]].astype(np.float64),
+                      node_prob[indptr[u]:indptr[u + 1]],
+                      node_alias[indptr[u]:indptr[u + 1]])
+        return node_prob, node_alias
+
+    @njit(parallel=True, cache=True)
+    def _walk_kernel_first_order(indptr, indices, node_prob, node_alias, starts, len_walk, out):
+        for r in prange(starts.shape[0]):
+            node = starts[r]
+            out[r, 0] = node
+            for j in range(1, len_walk):
+                deg = indptr[node + 1] - indptr[node]
+                if deg == 0:
+                    out[r, j] = node
+                    continue
+                i = np.random.randint(0, deg)
+                if np.random.random() >= node_prob[indptr[node] + i]:
+                    i = node_alias[indptr[node] + i]
+                node = indices[indptr[node] + i]
+                out[r, j] = node
+
+    @njit(parallel=True, cache=True)
+    def _build_tables(indptr, indices, weights, p, q):
+        n_nodes = indptr.shape[0] - 1
+        n_edges = indices.shape[0]
+        node_prob = np.zeros(n_edges, dtype=np.float32)
+        node_alias = np.zeros(n_edges, dtype=np.int32)
+        # One second-order table per directed edge (u -> v), of size deg(v)
+        edge_off = np.zeros(n_edges + 1, dtype=np.int64)
+        for e in range(n_edges):
+            v = indices[e]
+            edge_off[e + 1] = edge_off[e] + (indptr[v + 1] - indptr[v])
+        edge_prob = np.zeros(edge_off[-1], dtype=np.float32)
+        edge_alias = np.zeros(edge_off[-1], dtype=np.int32)
+
+        for u in prange(n_nodes):
+            if indptr[u + 1] > indptr[u]:
+                _vose(weights[indptr[u]:indptr[u + 1]].astype(np.float64),
+                      node_prob[indptr[u]:indptr[u + 1]],
+                      node_alias[indptr[u]:indptr[u + 1]])
+            for e in range(indptr[u], indptr[u + 1]):
+                v = indices[e]
+                deg_v = indptr[v + 1] - indptr[v]
+                if deg_v == 0:
+                    continue
+                biased = np.empty(deg_v, dtype=np.float64)
+                for i in range(deg_v):
+                    n = indices[indptr[v] + i]
+                    w = weights[indptr[v] + i]
+                    if n == u:
+                        biased[i] = w / p
+                    elif _contains(indices, indptr[u], indptr[u + 1], n):
+                        biased[i] = w
+                    else:
+                        biased[i] = w / q
+                _vose(biased,
+                      edge_prob[edge_off[e]:edge_off[e + 1]],
+                      edge_alias[edge_off[e]:edge_off[e + 1]])
+        return node_prob, node_alias, edge_off, edge_prob, edge_alias
+
+    @njit(cache=True)
+    def _edge_id(indptr, indices, u, v):
+        lo, hi = indptr[u], indptr[u + 1]
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if indices[mid] < v:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    @njit(parallel=True, cache=True)
+    def _walk_kernel_its(indptr, indices, weights, node_prob, node_alias,
+                         starts, len_walk, p, q, out):
+        # Inverse-transform sampling: biased weights are rebuilt per step and
+        # sampled through a cumulative sum + binary search. O(deg) per step
+        # instead of O(1), but no per-edge table memory.
+        for r in prange(starts.shape[0]):
+            node = starts[r]
+            out[r, 0] = node
+            if indptr[node + 1] == indptr[node]:
+                for j in range(1, len_walk):
+                    out[r, j] = node
+                continue
+            i = np.random.randint(0, indptr[node + 1] - indptr[node])
+            if np.random.random() >= node_prob[indptr[node] + i]:
+                i = node_alias[indptr[node] + i]
+            out[r, 1] = indices[indptr[node] + i]
+            for j in range(2, len_walk):
+                prev, curr = out[r, j - 2], out[r, j - 1]
+                deg = indptr[curr + 1] - indptr[curr]
+                cum = np.empty(deg, dtype=np.float64)
+                total = 0.
+                for i in range(deg):
+                    n = indices[indptr[curr] + i]
+                    w = np.float64(weights[indptr[curr] + i])
+                    if n == prev:
+                        w /= p
+                    elif not _contains(indices, indptr[prev], indptr[prev + 1], n):
+                        w /= q
+                    total += w
+                    cum[i] = total
+                draw = np.random.random() * total
+                i = np.searchsorted(cum, draw)
+                if i >= deg:
+                    i = deg - 1
+                out[r, j] = indices[indptr[curr] + i]
+
+    @njit(parallel=True, cache=True)
+    def _walk_kernel(indptr, indices, node_prob, node_alias,
+                     edge_off, edge_prob, edge_alias, starts, len_walk, out):
+        for r in prange(starts.shape[0]):
+            node = starts[r]
+            out[r, 0] = node
+            if indptr[node + 1] == indptr[node]:
+                for j in range(1, len_walk):
+                    out[r, j] = node
+                continue
+            i = np.random.randint(0, indptr[node + 1] - indptr[node])
+            if np.random.random() >= node_prob[indptr[node] + i]:
+                i = node_alias[indptr[node] + i]
+            out[r, 1] = indices[indptr[node] + i]
+            for j in range(2, len_walk):
+                prev, curr = out[r, j - 2], out[r, j - 1]
+                e = _edge_id(indptr, indices, prev, curr)
+                deg = edge_off[e + 1] - edge_off[e]
+                if deg == 0:
+                    out[r, j] = curr
+                    continue
+                i = np.random.randint(0, deg)
+                if np.random.random() >= edge_prob[edge_off[e] + i]:
+                    i = edge_alias[edge_off[e] + i]
+                out[r, j] = indices[indptr[curr] + i]
+
+
+# Beyond this many second-order table entries (sum of deg(v) over directed
+# edges), the biased kernel switches to inverse-transform sampling instead
+# of materializing per-edge alias tables.
+MAX_ALIAS_ENTRIES = 50_000_000
+
+
+class Node2Vec(DeepWalk):
+
+    def __init__(self, p=1., q=1., use_gpu=None, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.p = p
+        self.q = q
+        # None: use the GPU whenever RAPIDS cugraph is importable
+        self.use_gpu = CUGRAPH_AVAILABLE if use_gpu is None else use_gpu
+
+    def get_attributes(self):
+        return {
+            **super().get_attributes(),
+            "p": self.p,
+            "q": self.q
+        }
+
+    def _generate_walks_gpu(self, indptr, indices, weights, id2node, starts):
+        # cugraph runs its own alias/rejection sampling on device; only the
+        # resulting walk matrix comes back to the host, for Word2Vec.
+        degrees = (indptr[1:] - indptr[:-1]).astype(np.int32)
+        edges = cudf.DataFrame({
+            "src": np.repeat(np.arange(len(id2node), dtype=np.int32), degrees),
+            "dst": indices,
+            "weight": weights,
+        })
+        gpu_graph = cugraph.Graph()
+        gpu_graph.from_cudf_edgelist(edges, source="src", destination="dst",
+                                     edge_attr="weight", renumber=False)
+        vertex_paths, _, _ = cugraph.node2vec(gpu_graph, cudf.Series(starts),
+                                              max_depth=self.walk_length,
+                                              compress_result=False,
+                                              p=self.p, q=self.q)
+        out = vertex_paths.to_numpy().astype(np.int32).reshape(len(starts), self.walk_length)
+        return WalkCorpus(out, id2node)
+
+    @timeit(var_name="generate_walks")
+    def _generate_walks(self, graph: Graph):
+        indptr, indices, weights, node2id, id2node = to_csr(graph)
+        first_order = self.p == 1 and self.q == 1
+        # One shuffled pass over all nodes per n_walks round; permuting an
+        # int32 id array is raw swaps, not the object-dtype shuffle path
+        rng = np.random.default_rng(np.random.randint(2 ** 31))
+        starts = np.concatenate([rng.permutation(len(id2node)).astype(np.int32)
+                                 for _ in range(self.n_walks)])
+        if self.use_gpu and CUGRAPH_AVAILABLE:
+            return self._generate_walks_gpu(indptr, indices, weights, id2node, starts)
+        if NUMBA_AVAILABLE:
+            out = np.empty((starts.shape[0], self.walk_length), dtype=np.int32)
+            if first_order:
+                node_prob, node_alias = _build_node_tables(indptr, weights)
+                _walk_kernel_first_order(indptr, indices, node_prob, node_alias,
+                                         starts, self.walk_length, out)
+            else:
+                degrees = indptr[1:] - indptr[:-1]
+                table_entries = int(degrees[indices].sum())
+                if table_entries <= MAX_ALIAS_ENTRIES:
+                    tables = _build_tables(indptr, indices, weights, self.p, self.q)
+                    _walk_kernel(indptr, indices, *tables, starts, self.walk_length, out)
+                else:
+                    node_prob, node_alias = _build_node_tables(indptr, weights)
+                    _walk_kernel_its(indptr, indices, weights, node_prob, node_alias,
+                                     starts, self.walk_length, self.p, self.q, out)
+            return WalkCorpus(out, id2node)
+        uniform = bool(np.all(weights == 1))
+        n_workers = mp.cpu_count()
+        chunks = np.array_split(starts, min(len(starts), 4 * n_workers))
+        seeds = [int(s.generate_state(1)[0]) for s in
+                 np.random.SeedSequence(np.random.randint(2 ** 31)).spawn(len(chunks))]
+        shms = share_csr(graph, indptr, indices, weights)
+        initargs = ([shm.name for shm in shms], len(id2node), len(indices),
+                    self.walk_length, self.p, self.q, uniform)
+        out = np.empty((len(starts), self.walk_length), dtype=np.int32)
+        row = 0
+        with mp.Pool(n_workers, initializer=_init_walk_worker, initargs=initargs) as pool:
+            for chunk_walks in pool.imap_unordered(_walk_chunk, zip(seeds, chunks)):
+                for walk in chunk_walks:
+                    out[row] = walk
+                    row += 1
+        return WalkCorpus(out, id2node)
@@ -1,26 +1,320 @@
 import networkx as nx
 import numpy as np
+from multiprocessing import shared_memory
+import weakref
 
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+# CSR conversions keyed by source graph, so repeated fits on the same
+# (immutable) graph — e.g. experiment reps — convert only once.
+_csr_cache = weakref.WeakKeyDictionary()
+
+
+def to_csr(graph: nx.Graph):
+    """
+    Converts a networkx graph to a CSR adjacency representation.
+    Neighbours of node i are indices[indptr[i]:indptr[i+1]], sorted by id,
+    with matching edge weights in weights (1. when the edge is unweighted).
+    The result is cached per graph object.
+
+    Ids are assigned in descending degree order: a walk visits nodes in
+    proportion to their degree, so the hottest CSR rows land in a small
+    contiguous prefix of indices/weights that stays cache-resident, instead
+    of being scattered across the arrays. Walk output is in ids either way,
+    and id2node reflects the ordering, so callers are unaffected.
+
+    :param graph: The input graph
+    :return: (indptr, indices, weights, node2id, id2node)
+    """
+    if graph in _csr_cache:
+        return _csr_cache[graph]
+    id2node = sorted(graph, key=lambda node: len(graph[node]), reverse=True)
+    node2id = {node: i for i, node in enumerate(id2node)}
+    indptr = np.zeros(len(id2node) + 1, dtype=np.int64)
+    for i, node in enumerate(id2node):
+        indptr[i + 1] = indptr[i] + len(graph[node])
+    indices = np.empty(indptr[-1], dtype=np.int32)
+    weights = np.ones(indptr[-1], dtype=np.float32)
+    for i, node in enumerate(id2node):
+        pos = indptr[i]
+        for n, attrs in graph[node].items():
+            indices[pos] = node2id[n]
+            weights[pos] = attrs.get("weight", 1)
+            pos += 1
+        order = np.argsort(indices[indptr[i]:indptr[i + 1]], kind="stable")
+        indices[indptr[i]:indptr[i + 1]] = indices[indptr[i]:indptr[i + 1]][order]
+        weights[indptr[i]:indptr[i + 1]] = weights[indptr[i]:indptr[i + 1]][order]
+    csr = (indptr, indices, weights, node2id, id2node)
+    try:
+        _csr_cache[graph] = csr
+    except TypeError:  # non-weakrefable graph subclasses
+        pass
+    return csr
+
+
+class WalkCorpus:
+    """
+    Re-iterable corpus of walks that can be handed directly to
+    gensim.models.Word2Vec (which iterates it once to build the vocabulary
+    and once per training epoch). Walks are kept as node ids in a compact
+    int32 matrix — walks that terminated early (dead-end node) are padded
+    with -1, dropped on iteration — and remapped to node labels lazily,
+    one walk at a time, so the full list-of-lists of labels is never
+    materialized.
+    """
+
+    def __init__(self, walks: np.ndarray, id2node=None):
+        self.walks = walks
+        self.id2node = id2node
+
+    def __len__(self):
+        return len(self.walks)
+
+    def __iter__(self):
+        if self.id2node is None:
+            for row in self.walks:
+                yield list(row[row >= 0])
+        else:
+            for row in self.walks:
+                yield [self.id2node[v] for v in row if v >= 0]
+
+    def shuffle(self):
+        # Row permutation of the 2D matrix; the Generator shuffle is
+        # lock-free, seeded off the global stream for reproducibility
+        np.random.default_rng(np.random.randint(2 ** 31)).shuffle(self.walks, axis=0)
+
+    def to_corpus_file(self, path):
+        """
+        Writes the walks as one space-separated line of node ids per walk,
+        in gensim's corpus_file (LineSentence) format. Ids are written
+        as-is: remapping to node labels is left to the caller once the
+        vocabulary is built, so the file stays compact and the training
+        loop never touches Python label objects.
+        """
+        with open(path, "w") as fout:
+            for row in self.walks:
+                fout.write(" ".join(map(str, row[row >= 0])))
+                fout.write("\n")
+
+
+def build_alias_table(weights):
+    """
+    Builds an alias table for the given (unnormalized) weights using Vose's
+    algorithm. Sampling from the table is O(1): draw a slot uniformly, then
+    accept the slot or fall back to its alias.
+
+    :param weights: Unnormalized transition weights
+    :return: (prob_table, alias_table) as float32 / int32 arrays
+    """
+    n = len(weights)
+    prob_table = np.zeros(n, dtype=np.float32)
+    alias_table = np.zeros(n, dtype=np.int32)
+    scaled = np.asarray(weights, dtype=np.float64) * (n / np.sum(weights))
+
+    small = [i for i in range(n) if scaled[i] < 1.]
+    large = [i for i in range(n) if scaled[i] >= 1.]
+
+    while small and large:
+        s, l = small.pop(), large.pop()
+        prob_table[s] = scaled[s]
+        alias_table[s] = l
+        scaled[l] = scaled[l] + scaled[s] - 1.
+        if scaled[l] < 1.:
+            small.append(l)
+        else:
+            large.append(l)
+    for i in large:
+        prob_table[i] = 1.
+    for i in small:
+        prob_table[i] = 1.
+    return prob_table, alias_table
+
+
+def sample_alias_table(prob_table, alias_table, rng):
+    i = rng.integers(len(prob_table))
+    if rng.random() < prob_table[i]:
+        return i
+    return alias_table[i]
+
+
+# Shared-memory copies of CSR arrays, keyed by source graph: across reps on
+# the same (immutable) graph, every fit and every pool worker then share one
+# physical copy. Blocks are unlinked when the graph is garbage collected.
+_shared_csr = weakref.WeakKeyDictionary()
+
+
+def _release_shared(shms):
+    for shm in shms:
+        shm.close()
+        shm.unlink()
 
-def generate_rw(graph: nx.Graph, node, len_walk):
-    walk = [node]
 
-    while len(walk) < len_walk:
-        node_neighbours = [n for n in graph[node]]
-        weights = []
-        norm = 0
-        if not node_neighbours:
-            return [node]*len_walk
-        for n in node_neighbours:
-            edge = graph[n][node]
-            if 'weight' in edge:
-                weights.append(edge['weight'])
-                norm += edge['weight']
-            else:
-                weights.append(1)
-                norm += 1
-
-        weights = np.array(weights) / norm
-        walk.append(np.random.choice(a=node_neighbours, p=weights))
+def share_csr(graph, indptr, indices, weights):
+    if graph in _shared_csr:
+        return _shared_csr[graph][0]
+    shms = []
+    for arr in (indptr, indices, weights):
+        shm = shared_memory.SharedMemory(create=True, size=arr.nbytes)
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[:] = arr
+        shms.append(shm)
+    finalizer = weakref.finalize(graph, _release_shared, shms)
+    finalizer.atexit = True
+    _shared_csr[graph] = (shms, finalizer)
+    return shms
+
+
+def _row_cumsum(indptr, weights):
+    """Cumulative edge weights within each CSR row, for inverse-transform
+    sampling: one searchsorted per step instead of np.random.choice."""
+    cum = np.cumsum(weights, dtype=np.float64)
+    row_start = np.concatenate(([0.], cum))[indptr[:-1]]
+    return cum - np.repeat(row_start, np.diff(indptr))
+
+
+# Per-worker walk context, populated once by the pool initializer: workers
+# attach to the shared CSR blocks and precompute the row cumsums a single
+# time, so tasks carry nothing but a seed and a chunk of start ids.
+_worker_ctx = {}
+
+
+def _init_rw_worker(shm_names, n_nodes, n_edges, walk_length):
+    shms = [shared_memory.SharedMemory(name=name) for name in shm_names]
+    _worker_ctx["shms"] = shms  # keep references alive for the worker lifetime
+    indptr = np.ndarray((n_nodes + 1,), dtype=np.int64, buffer=shms[0].buf)
+    indices = np.ndarray((n_edges,), dtype=np.int32, buffer=shms[1].buf)
+    weights = np.ndarray((n_edges,), dtype=np.float32, buffer=shms[2].buf)
+    _worker_ctx["indptr"] = indptr
+    _worker_ctx["indices"] = indices
+    _worker_ctx["cum_weights"] = _row_cumsum(indptr, weights)
+    _worker_ctx["walk_length"] = walk_length
+
+
+def generate_rw_batch(task):
+    """
+    Runs one chunk of first-order weighted walks against the CSR adjacency
+    set up by _init_rw_worker. One task covers thousands of walks, so IPC
+    is O(n_chunks) and the graph itself is never pickled.
+
+    :param task: (seed, starts)
+    :return: int32 matrix of shape (len(starts), walk_length)
+    """
+    seed, starts = task
+    indptr = _worker_ctx["indptr"]
+    indices = _worker_ctx["indices"]
+    cum_weights = _worker_ctx["cum_weights"]
+    len_walk = _worker_ctx["walk_length"]
+    rng = np.random.default_rng(seed)
+    out = np.empty((starts.shape[0], len_walk), dtype=np.int32)
+    for i in range(starts.shape[0]):
+        node = starts[i]
+        out[i, 0] = node
+        for j in range(1, len_walk):
+            lo, hi = indptr[node], indptr[node + 1]
+            if hi == lo:
+                out[i, j:] = -1
+                break
+            r = rng.random() * cum_weights[hi - 1]
+            node = indices[lo + np.searchsorted(cum_weights[lo:hi], r, side="right")]
+            out[i, j] = node
+    return out
+
+
+if NUMBA_AVAILABLE:
+
+    @njit(parallel=True, nogil=True, cache=True)
+    def generate_rw_kernel(indptr, indices, cum_weights, starts, len_walk, out):
+        # One thread per walk; each step is a uniform draw resolved against
+        # the per-row cumulative weights by binary search. Runs without the
+        # GIL, so no process pool (and no pickling) is needed at all.
+        for r in prange(starts.shape[0]):
+            node = starts[r]
+            out[r, 0] = node
+            for j in range(1, len_walk):
+                lo, hi = indptr[node], indptr[node + 1]
+                if hi == lo:
+                    out[r, j] = -1
+                    continue
+                target = np.random.random() * cum_weights[hi - 1]
+                node = indices[lo + np.searchsorted(cum_weights[lo:hi], target,
+                                                    side="right")]
+                out[r, j] = node
+
+
+# First-order alias tables keyed by graph, one (prob, alias) slot per CSR
+# edge: built once in O(|E|), then every walk step is O(1) — two array
+# lookups and two uniform draws — instead of rebuilding the neighbour
+# distribution and calling np.random.choice.
+_alias_cache = weakref.WeakKeyDictionary()
+
+
+def _node_alias_tables(graph):
+    if graph in _alias_cache:
+        return _alias_cache[graph]
+    indptr, indices, weights, node2id, id2node = to_csr(graph)
+    if np.all(weights == 1.):
+        # Unweighted graph: uniform sampling needs no tables at all
+        prob = alias = None
+    else:
+        prob = np.empty(indices.shape[0], dtype=np.float32)
+        alias = np.empty(indices.shape[0], dtype=np.int32)
+        for v in range(len(id2node)):
+            lo, hi = indptr[v], indptr[v + 1]
+            if hi > lo:
+                prob[lo:hi], alias[lo:hi] = build_alias_table(weights[lo:hi])
+    tables = (indptr, indices, prob, alias, node2id, id2node)
+    _alias_cache[graph] = tables
+    return tables
+
+
+_default_rng = np.random.default_rng()
+
+# Per-graph row cumsums for the compiled kernel path of generate_rw
+_cum_cache = weakref.WeakKeyDictionary()
+
+
+def generate_rw(graph: nx.Graph, node, len_walk, rng=None):
+    indptr, indices, prob, alias, node2id, id2node = _node_alias_tables(graph)
+
+    v = node2id[node]
+    if indptr[v + 1] == indptr[v]:
+        return [node] * len_walk
+
+    if rng is None and NUMBA_AVAILABLE:
+        # Run the single walk through the compiled kernel: the whole inner
+        # loop executes as native code. An explicit rng forces the Python
+        # path, since the kernel draws from numba's own per-thread state.
+        if graph not in _cum_cache:
+            weights = to_csr(graph)[2]
+            _cum_cache[graph] = _row_cumsum(indptr, weights)
+        out = np.empty((1, len_walk), dtype=np.int32)
+        generate_rw_kernel(indptr, indices, _cum_cache[graph],
+                           np.array([v], dtype=np.int32), len_walk, out)
+        return [id2node[i] for i in out[0]]
+
+    rng = _default_rng if rng is None else rng
+    walk = [node]
+    # All randomness for the walk is drawn in two vectorized calls up
+    # front; per-step work is then pure indexing
+    slot_draws = rng.random(len_walk - 1)
+    if prob is None:
+        # Uniform short-circuit: one draw per step
+        for u in slot_draws:
+            lo = indptr[v]
+            v = indices[lo + int(u * (indptr[v + 1] - lo))]
+            walk.append(id2node[v])
+        return walk
+    accept_draws = rng.random(len_walk - 1)
+    for u, a in zip(slot_draws, accept_draws):
+        lo = indptr[v]
+        k = lo + int(u * (indptr[v + 1] - lo))
+        if a >= prob[k]:
+            k = lo + alias[k]
+        v = indices[k]
+        walk.append(id2node[v])
 
     return walk
@@ -19,7 +19,12 @@ def node_classification_pipeline(graph: nx.Graph, embeddings: np.ndarray, id2nod
     test_size = kwargs["test_size"]
 
     node_vectors = embeddings
-    labels = np.array([graph.nodes[word]["community"] for word in id2node])
+    # The node -> community mapping is invariant across reps; callers can pass
+    # it precomputed to avoid re-scanning the NetworkX attribute dicts each rep.
+    node_labels = kwargs.get("node_labels")
+    if node_labels is None:
+        node_labels = dict(graph.nodes(data="community"))
+    labels = np.array([node_labels[word] for word in id2node])
 
     node_vectors_train, node_vectors_test, labels_train, labels_test = train_test_split(node_vectors, labels,
                                                                                         test_size=test_size)
@@ -78,21 +83,27 @@ def link_prediction_pipeline_old(graph, embedder: Embedder, classifier, embed_kw
     index_train_pos, index_test_pos = index_pos[:-int(nb_edges*test_size)], index_pos[-int(nb_edges*test_size):]
     edges_train, edges_test = edges[index_train_pos], edges[index_test_pos]
 
-    # Retreive corresponding embedding a create train test sets
-    X_neg_train = np.array(
-        [np.concatenate((embedder.embeddings[embedder.node2id[u]], embedder.embeddings[embedder.node2id[v]])) for u, v
-         in non_edges_train])
-    X_neg_test = np.array(
-        [np.concatenate((embedder.embeddings[embedder.node2id[u]], embedder.embeddings[embedder.node2id[v]])) for u, v
-         in non_edges_test])
-    X_pos_train = np.array(
-        [np.concatenate((embedder.embeddings[embedder.node2id[u]], embedder.embeddings[embedder.node2id[v]])) for u, v
-         in edges_train])
-    X_pos_test = np.array(
-        [np.concatenate((embedder.embeddings[embedder.node2id[u]], embedder.embeddings[embedder.node2id[v]])) for u, v
-         in edges_test])
-    X_train, X_test = np.concatenate([X_neg_train, X_pos_train]), np.concatenate([X_neg_test, X_pos_test])
-    Y_train, Y_test = np.concatenate([np.zeros(X_neg_train.shape[0]), np.ones(X_pos_train.shape[0])]), np.concatenate([np.zeros(X_neg_test.shape[0]), np.ones(X_pos_test.shape[0])])
+    # Retreive corresponding embedding a create train test sets: both node
+    # ids of every pair are gathered with fancy indexing straight into one
+    # preallocated buffer per split, instead of one np.concatenate per pair
+    # followed by a concatenate of the four intermediates
+    emb = embedder.embeddings
+    d = emb.shape[1]
+
+    def build_split(pairs_neg, pairs_pos):
+        n_neg, n_pos = len(pairs_neg), len(pairs_pos)
+        ids = np.fromiter((embedder.node2id[n] for pairs in (pairs_neg, pairs_pos) for pair in pairs for n in pair),
+                          dtype=np.int64, count=2 * (n_neg + n_pos)).reshape(-1, 2)
+        X = np.empty((n_neg + n_pos, 2 * d), dtype=np.float32)
+        X[:, :d] = emb[ids[:, 0]]
+        X[:, d:] = emb[ids[:, 1]]
+        Y = np.empty(n_neg + n_pos, dtype=np.uint8)
+        Y[:n_neg] = 0
+        Y[n_neg:] = 1
+        return X, Y
+
+    X_train, Y_train = build_split(non_edges_train, edges_train)
+    X_test, Y_test = build_split(non_edges_test, edges_test)
 
 
     # Classify
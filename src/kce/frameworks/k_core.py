@@ -1,6 +1,8 @@
 from .framework import Framework
 from networkx import Graph
-from kce.utils import timeit
+from kce.utils import timeit, NUMBA_AVAILABLE
+if NUMBA_AVAILABLE:
+    from kce.utils import spmm_add
 import numpy as np
 from scipy import sparse
 import networkx as nx
@@ -8,8 +10,11 @@ import networkx as nx
 
 class KCore(Framework):
 
-    def __init__(self, embedder, **kwargs):
+    def __init__(self, embedder, dtype=np.float32, **kwargs):
         self.unreachable_nodes = None
+        # float32 halves the bandwidth of the memory-bound propagation
+        # products and is plenty of precision for embeddings
+        self.dtype_ = np.dtype(dtype)
         super().__init__(embedder, **kwargs)
 
     @timeit(var_name="k_core")
@@ -25,51 +30,104 @@ class KCore(Framework):
             "id2node": self.embedder_.id2node
         }
 
-    def _get_reachable_subgraph(self, graph, from_graph):
-        adj_nodes = set().union(*[set(graph.neighbors(node)) for node in list(from_graph)])
-        reachable_node = [node for node in graph if node in adj_nodes and node not in from_graph]
-        return graph.subgraph(reachable_node)
+    def _get_reachable_nodes(self, graph, from_nodes, embedded_set=None):
+        # Plain sets for O(1) membership and in-place updates straight off
+        # the adjacency dicts. When the embedded set is passed separately,
+        # from_nodes can be just the newly embedded frontier, making the
+        # call O(|frontier| * deg) instead of rescanning every embedded node
+        if embedded_set is None:
+            embedded_set = from_nodes if isinstance(from_nodes, set) else set(from_nodes)
+        adj_nodes = set()
+        for node in from_nodes:
+            adj_nodes.update(graph._adj[node])
+        return adj_nodes - embedded_set
 
 
     @timeit(var_name="propagate")
     def _propagate(self, graph: Graph, embedded_sub_graph: Graph, embeddings: np.array, node2id, id2node, max_itr: int = 20):
-        reachable_nodes = self._get_reachable_subgraph(graph, embedded_sub_graph)
+        # Embedded membership is tracked as a plain set grown in place;
+        # re-wrapping node2id in a NetworkX subgraph every iteration only
+        # paid view-construction cost for membership tests
+        embedded_set = set(embedded_sub_graph)
+        reachable_nodes = self._get_reachable_nodes(graph, embedded_set)
 
+        embeddings = embeddings.astype(self.dtype_, copy=False)
         Z1 = embeddings
 
-        sparse_adj = nx.to_scipy_sparse_matrix(graph)
-
-        while reachable_nodes.order() > 0:
+        sparse_adj = sparse.csr_matrix(nx.to_scipy_sparse_array(graph))
+        # CSC view built once: column selection is then a cheap indptr slice
+        # instead of fancy indexing through the CSR structure
+        sparse_adj_csc = sparse_adj.tocsc()
+        # node -> row in sparse_adj, computed once instead of re-enumerating
+        # the whole graph against subgraph membership every iteration
+        node_pos = {node: i for i, node in enumerate(graph)}
+        # In node2id insertion order, so row i of A1 lines up with row i of
+        # the embeddings matrix; extended in place as nodes get embedded
+        embedded_indexes = np.fromiter((node_pos[node] for node in node2id),
+                                       dtype=np.int64, count=len(node2id))
+        reachable_mask = np.zeros(graph.order(), dtype=bool)
+        graph_nodes = list(graph)
+
+        while len(reachable_nodes) > 0:
             print("Propagating : current embedding size : {}, reachable nodes : {}, total graph size : {}".format(
-                len(embedded_sub_graph),
+                len(embedded_set),
                 len(reachable_nodes),
                 len(graph)))
             Z1 = embeddings
-            reachable_indexes = [i for i, node in enumerate(graph) if node in reachable_nodes]
-            embedded_indexes = [i for i, node in enumerate(graph) if node in embedded_sub_graph]
-            A1, A2 = sparse_adj[embedded_indexes, :][:, reachable_indexes], sparse_adj[reachable_indexes, :][:, reachable_indexes]
+            # Sorted, because boolean-mask slicing below returns rows and
+            # columns in ascending index order; sets have no useful order,
+            # so the node appends go through graph_nodes to stay aligned
+            # with the Z2 rows
+            reachable_indexes = np.sort(np.fromiter((node_pos[node] for node in reachable_nodes),
+                                                    dtype=np.int64, count=len(reachable_nodes)))
+            reachable_mask[reachable_indexes] = True
+            # Drop the non-reachable columns first (CSC), so the row slices
+            # below copy only edges incident to the reachable batch
+            reachable_cols = sparse_adj_csc[:, reachable_mask].tocsr()
+            A1 = reachable_cols[embedded_indexes, :]
+            A2 = reachable_cols[reachable_mask, :]
+            reachable_mask[reachable_indexes] = False
             norm = sparse.hstack([A1.T, A2]).sum(axis=1)
-            A1_norm, A2_norm = sparse.csc_matrix(A1/norm.T), sparse.csc_matrix(A2/norm.T)
-            Z2 = sparse.csr_matrix(np.random.uniform(-1, 1, size=(reachable_nodes.order(), self.out_dim_)))
-            for itr in range(max_itr):
-                Z2 = A1_norm.T@Z1 + A2_norm.T@Z2
-
-
-            n1 = embedded_sub_graph.order()
-            for node in reachable_nodes:
+            # Transposed propagation matrices converted to CSR once, outside
+            # the inner loop; Z1/Z2 stay dense so each step is a sparse @
+            # dense product, the operation scipy is actually fast at
+            P1 = sparse.csr_matrix((A1 / norm.T).T, dtype=self.dtype_)
+            P2 = sparse.csr_matrix((A2 / norm.T).T, dtype=self.dtype_)
+            Z2 = np.random.uniform(-1, 1, size=(len(reachable_nodes), self.out_dim_)).astype(self.dtype_)
+            if NUMBA_AVAILABLE:
+                # Fused compiled update over pre-extracted CSR triples,
+                # double-buffered so the loop allocates nothing
+                Z2_new = np.empty_like(Z2)
+                for itr in range(max_itr):
+                    spmm_add(P1.indptr, P1.indices, P1.data, Z1,
+                             P2.indptr, P2.indices, P2.data, Z2, Z2_new)
+                    Z2, Z2_new = Z2_new, Z2
+            else:
+                for itr in range(max_itr):
+                    Z2 = P1.dot(Z1) + P2.dot(Z2)
+
+
+            n1 = len(node2id)
+            for idx in reachable_indexes:
+                node = graph_nodes[idx]
                 node2id[node] = n1
                 id2node.append(node)
                 n1 = n1 + 1
             embeddings = np.concatenate([embeddings, Z2], axis=0)
-            embedded_sub_graph = graph.subgraph(list(node2id.keys()))
-            reachable_nodes = self._get_reachable_subgraph(graph, embedded_sub_graph)
-
-        unreachable_nodes = graph.subgraph([node for node in graph if node not in embedded_sub_graph])
+            # reachable_indexes is in the same order the nodes were appended
+            # to node2id, so row alignment with embeddings is preserved
+            embedded_indexes = np.concatenate([embedded_indexes, reachable_indexes])
+            embedded_set.update(reachable_nodes)
+            # Only the fresh frontier can reach new nodes: everything
+            # reachable before this iteration is embedded now
+            reachable_nodes = self._get_reachable_nodes(graph, reachable_nodes, embedded_set)
+
+        unreachable_nodes = graph.subgraph([node for node in graph if node not in embedded_set])
         if unreachable_nodes:
-            unreachable_nodes_embeddings = sparse.csr_matrix(np.zeros((unreachable_nodes.order(), self.out_dim_)))
-            embeddings = np.concatenate([embeddings, unreachable_nodes_embeddings.todense()], axis=0)
+            unreachable_nodes_embeddings = np.zeros((unreachable_nodes.order(), self.out_dim_), dtype=embeddings.dtype)
+            embeddings = np.concatenate([embeddings, unreachable_nodes_embeddings], axis=0)
 
-            n1 = embedded_sub_graph.order()
+            n1 = len(node2id)
             for node in unreachable_nodes:
                 node2id[node] = n1
                 id2node.append(node)